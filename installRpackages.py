@@ -16,6 +16,28 @@ import re
 import pandas as pd
 import csv
 from datetime import datetime
+from functools import partial
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import atexit
+
+# Set in each worker process by runInstalls so parallel installs don't interleave writes to the same log
+_log_lock = None
+
+# Packages available through BiocManager, fetched by biocPackages
+_bioc_packages = None
+
+# isInstalled results by (r_version, package), and library content by r_version
+_installed_cache = {}
+_library_cache = {}
+
+# Content of success.txt/fail.txt by path, and of the failures directory by working_dir
+_attempts_cache = {}
+_failures_cache = {}
+
+# Result files kept open by appendLine, by path
+_append_files = {}
 
 def parse_arguments():
 	parser = argparse.ArgumentParser(description="Install R packages on the cluster")
@@ -24,6 +46,7 @@ def parse_arguments():
 	parser.add_argument("--vold", help="Old R version")
 	parser.add_argument("--git-repo", help="GitHub repository")
 	parser.add_argument("--quiet", action="store_true", help="Do not give any prompt")
+	parser.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 2)//2), help="Number of packages to install in parallel when migrating (default: half of the available cores)")
 
 	group = parser.add_mutually_exclusive_group(required=True)
 	group.add_argument("--migrate", action="store_true", help="Install all vold packages in vnew")
@@ -39,15 +62,19 @@ def parse_arguments():
 	if not os.path.isdir(working_dir):
 		sys.exit(f"{working_dir} doesn't exist")
 	working_dir = working_dir[:-1] if working_dir.endswith("/") else working_dir
+
+	if args.jobs<1:
+		sys.exit("--jobs must be at least 1")
 	
-	return [v_new, v_old, args.migrate, args.install, args.git_repo, working_dir, args.update, args.quiet]
+	return [v_new, v_old, args.migrate, args.install, args.git_repo, working_dir, args.update, args.quiet, args.jobs]
 
 def savePackageList(r_version: str, working_dir: str):
 	try:
+		# Drop the lock directories before sorting, sort() computes each casefold key once
+		packages = [item for item in os.listdir(f"/hpc/apps/R/{r_version}/lib64/R/library/") if not item.startswith("00LOCK")]
+		packages.sort(key=str.casefold)
 		with open(f"{working_dir}/{r_version}.txt", 'w') as fin:
-			for item in sorted(os.listdir(f"/hpc/apps/R/{r_version}/lib64/R/library/"), key=str.casefold):
-				if not item.startswith("00LOCK"):
-					_ = fin.write(item+"\n")
+			fin.writelines(item+"\n" for item in packages)
 
 	except FileNotFoundError as e:
 		raise RuntimeError(f"File not found: {e}") from e
@@ -61,36 +88,98 @@ def savePackageList(r_version: str, working_dir: str):
 	except OSError as e:
 		raise RuntimeError(f"OS error: {e}") from e
 
-# Save the list of packages that are in v_old but not in v_new
-def comparePackages(v_new: str, v_old: str, working_dir: str):
-	with open(f"{working_dir}/missing.txt", "w") as f:
-		installib.runBash(["grep", "-Fvx", "-f", f"{working_dir}/{v_new}.txt", f"{working_dir}/{v_old}.txt"], output_file=f)
+# Save the list of packages that are in v_old but not in v_new, and return it
+def comparePackages(v_new: str, v_old: str, working_dir: str) -> list[str]:
+	new = set(Path(f"{working_dir}/{v_new}.txt").read_text().splitlines())
+	missing = [pkg for pkg in Path(f"{working_dir}/{v_old}.txt").read_text().splitlines() if pkg not in new]
+	Path(f"{working_dir}/missing.txt").write_text("".join(pkg+"\n" for pkg in missing))
 
-def runRcmd(r_expr: str):
-	return installib.runBash(["Rscript", "-e", r_expr])
+	return missing
 
-# Check if a package exists and is correctly installed
-def isInstalled(r_version: str, package: str) -> bool:
-	dir_exists = os.path.isdir(f"/hpc/apps/R/{r_version}/lib64/R/library/{package}/")	
-	r_expr = f'quit(status = if (requireNamespace("{package}", quietly=TRUE)) 0 else 1)'
-	can_be_loaded = (runRcmd(r_expr)[0] == 0)
+# args are passed to the R expression as commandArgs(TRUE)
+def runRcmd(r_expr: str, args: list=None):
+	return installib.runBash(["Rscript", "-e", r_expr] + list(args or []))
+
+# Content of the library of each R version, listed once instead of checking one directory per package
+def libraryContents(r_version: str) -> set:
+	if r_version not in _library_cache:
+		try:
+			_library_cache[r_version] = set(os.listdir(f"/hpc/apps/R/{r_version}/lib64/R/library/"))
+		except OSError:
+			_library_cache[r_version] = set()
+	return _library_cache[r_version]
 
-	return dir_exists and can_be_loaded
+# Must be called after every install attempt so isInstalled checks the package again
+def forgetInstalled(r_version: str, package: str):
+	_installed_cache.pop((r_version, package), None)
+	_library_cache.pop(r_version, None)
 
+# Check if a package exists and is correctly installed
+def isInstalled(r_version: str, package: str) -> bool:
+	key = (r_version, package)
+	if key not in _installed_cache:
+		if package not in libraryContents(r_version):
+			_installed_cache[key] = False
+		else:
+			r_expr = f'quit(status = if (requireNamespace("{package}", quietly=TRUE)) 0 else 1)'
+			_installed_cache[key] = (runRcmd(r_expr)[0] == 0)
+
+	return _installed_cache[key]
+
+# Check many packages with a single R process instead of starting one per package
+# The results are saved in the isInstalled cache
+def bulkIsInstalled(r_version: str, packages: list[str]) -> dict[str, bool]:
+	packages = list(dict.fromkeys(packages))
+	library = libraryContents(r_version)
+	for package in packages:
+		if package not in library:
+			_installed_cache[(r_version, package)] = False
+
+	to_check = [p for p in packages if (r_version, p) not in _installed_cache]
+	if to_check:
+		r_expr = 'for (p in commandArgs(TRUE)) cat(p, requireNamespace(p, quietly=TRUE), "\\n", sep="\\t")'
+		[returncode, stderr, stdout] = runRcmd(r_expr, to_check)
+		if returncode!=0:
+			print(f"Could not check installed packages in R/{r_version}: {stderr}")
+
+		# Lines that can't be parsed (e.g. a package printing while loading) are left to isInstalled
+		for line in stdout.splitlines():
+			fields = line.split("\t")
+			if len(fields)>=2 and fields[0] in to_check and fields[1] in ("TRUE", "FALSE"):
+				_installed_cache[(r_version, fields[0])] = (fields[1]=="TRUE")
+
+	return {package: isInstalled(r_version, package) for package in packages}
+
+# Tries install.packages and then BiocManager in a single R process
 def installWithRscript(r_version: str, pkg: str, working_dir: str):
 	print(f"Installing {pkg} in R/{r_version} using Rscript...")
-	r_exp = f'install.packages("{pkg}")'
+	r_exp = f'''
+		p <- "{pkg}"
+		installers <- list(
+			Rscript = function() install.packages(p),
+			BiocManager = function() BiocManager::install(p, update=FALSE, ask=FALSE)
+		)
+		for (m in names(installers)) {{
+			ok <- tryCatch({{ installers[[m]](); requireNamespace(p, quietly=TRUE) }}, error=function(e) {{ message(conditionMessage(e)); FALSE }})
+			if (ok) {{ cat("\\n", m, "\\n", sep=""); quit(status=0) }}
+		}}
+		quit(status=1)
+	'''.strip()
 	[returncode, stderr, stdout] = runRcmd(r_exp)
+	forgetInstalled(r_version, pkg)
 
 	if returncode!=0 or not isInstalled(r_version, pkg):
 		err = (stderr or stdout).strip()
 		if err:
-			return [False, f"Installation of {pkg} using Rscript failed with error: {err}"]
+			return [False, f"Installation of {pkg} using Rscript/Bioconductor failed with error: {err}"]
 		else:
-			return [False, f"Installation of {pkg} using Rscript failed with return code {returncode} (no output captured)"]
+			return [False, f"Installation of {pkg} using Rscript/Bioconductor failed with return code {returncode} (no output captured)"]
 	
-	saveLog(r_version, pkg, "Rscript", working_dir)
-	return [True, f"Successfully installed {pkg} in R/{r_version} with Rscript"]
+	# The last line of the output is the method that worked
+	lines = stdout.strip().splitlines()
+	method = lines[-1] if lines and lines[-1] in ("Rscript", "BiocManager") else "Rscript"
+	saveLog(r_version, pkg, method, working_dir)
+	return [True, f"Successfully installed {pkg} in R/{r_version} with {method}"]
 
 def installWithTarball(r_version: str, pkg: str, working_dir: str):
 	print(f"Installing {pkg} in R/{r_version} using Tarball...")
@@ -113,6 +202,7 @@ def installWithTarball(r_version: str, pkg: str, working_dir: str):
 
 	# Install tarball
 	[returncode, stderr, stdout] = installib.runBash(["R", "CMD", "INSTALL", str(tarball)])
+	forgetInstalled(r_version, pkg)
 	if returncode!=0 or not isInstalled(r_version, pkg):
 		err = (stderr or stdout).strip()
 		if err:
@@ -126,13 +216,14 @@ def installWithTarball(r_version: str, pkg: str, working_dir: str):
 def installFromGitHub(r_version: str, repo: str, pkg: str, working_dir: str):
 	print(f"Installing {pkg} in R/{r_version} using GitHub...")
 
-	msg = ""
+	errors = []
 	for opt in ["pak", "remotes", "devtools"]:
 		if opt=="pak":
 			r_expr = f'pak::pak("{repo}")'
 		else:
 			r_expr = f'{opt}::install_github("{repo}")'
 		[returncode, stderr, stdout] = runRcmd(r_expr)
+		forgetInstalled(r_version, pkg)
 
 		if returncode==0 and isInstalled(r_version, pkg):
 			saveLog(r_version, pkg, "GitHub", working_dir)
@@ -140,10 +231,10 @@ def installFromGitHub(r_version: str, repo: str, pkg: str, working_dir: str):
 		
 		err = (stderr or stdout).strip()
 		if err:
-			",".join([msg, err])
+			errors.append(f"{opt}: {err}")
 
-	if msg!="":
-		return [False, f"Installation of {pkg} using GitHub failed with error: {err}"]
+	if errors:
+		return [False, f"Installation of {pkg} using GitHub failed with error: {', '.join(errors)}"]
 	
 	return [False, f"Installation of {pkg} using GitHub failed (no output captured)"]
 
@@ -151,6 +242,7 @@ def installGiotto(r_version: str, giotto_pkg:str, working_dir: str):
 	print(f"Installing {giotto_pkg} in R/{r_version} using Giotto...")
 	r_expr = f'pak::pkg_install("{giotto_pkg}")'
 	[returncode, stderr, stdout] = runRcmd(r_expr)
+	forgetInstalled(r_version, giotto_pkg)
 
 	if returncode!=0 or not isInstalled(r_version, giotto_pkg):
 		err = (stderr or stdout).strip()
@@ -166,6 +258,7 @@ def installBiocManager(r_version: str, pkg: str, working_dir: str):
 	print(f"Installing {pkg} in R/{r_version} using Bioconductor...")
 	r_expr = f'BiocManager::install(c("{pkg}"))'
 	[returncode, stderr, stdout] = runRcmd(r_expr)
+	forgetInstalled(r_version, pkg)
 
 	if returncode!=0 or not isInstalled(r_version, pkg):
 		err = (stderr or stdout).strip()
@@ -179,12 +272,13 @@ def installBiocManager(r_version: str, pkg: str, working_dir: str):
 
 def saveLog(rversion:str, pkgname:str, install_method:str, working_dir: str):
 	filename = f"{working_dir}/added_with_script.csv"
-	new_file = not os.path.exists(filename)
-	with open(filename, "a", newline="") as f:
-		writer = csv.writer(f)
-		if new_file:
-			writer.writerow(["rversion", "pkgname", "install_method", "date"])
-		writer.writerow([rversion, pkgname, install_method, datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
+	with (_log_lock or nullcontext()):
+		new_file = not os.path.exists(filename)
+		with open(filename, "a", newline="") as f:
+			writer = csv.writer(f)
+			if new_file:
+				writer.writerow(["rversion", "pkgname", "install_method", "date"])
+			writer.writerow([rversion, pkgname, install_method, datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
 
 def installPackage(r_version, working_dir, pkg_install=None, pkg_update=None, check_pastFail=True, gitRepo=None, bioc=False):
 	package = pkg_install if pkg_install else pkg_update
@@ -192,12 +286,15 @@ def installPackage(r_version, working_dir, pkg_install=None, pkg_update=None, ch
 		print("No package provided")
 		return [False, ""]
 
+	# Check again instead of trusting the cache: another install (possibly in another worker)
+	# may have added this package as a dependency since it was last checked
+	if pkg_install:
+		forgetInstalled(r_version, package)
 	if pkg_install and isInstalled(r_version, package):
 		print(f"{package} is already installed in R/{r_version}")
 		return [True, ""]
 	
-	fail_txt = f"{working_dir}/failures/" + re.sub(r"[^\w]", "_", package) + ".txt"
-	if check_pastFail and os.path.isfile(fail_txt):
+	if check_pastFail and hadFailed(package, working_dir):
 		print(f"{package} installation already failed")
 		return [False, ""]
 	
@@ -207,60 +304,157 @@ def installPackage(r_version, working_dir, pkg_install=None, pkg_update=None, ch
 	if package.endswith("/Giotto"):
 		return installGiotto(r_version, package, working_dir)
 	
-	if (not bioc):
-		[success, msg] = installWithRscript(r_version, package, working_dir)
-		if success:
-			return [success, msg]
-	else:
-		msg = ""
-	
-	if (not bioc):
-		[success, msg2] = installWithTarball(r_version, package, working_dir)
-		if success:
-			return [success, ", ".join([msg, msg2])]
-	else:
-		msg2=""
-
-	[success, msg3] = installBiocManager(r_version, package, working_dir)
-	return [success, ", ".join([msg, msg2, msg3])]
+	if bioc:
+		return installBiocManager(r_version, package, working_dir)
+
+	# Rscript already falls back to BiocManager, the tarball needs a separate download and build
+	msgs = []
+	[success, msg] = installWithRscript(r_version, package, working_dir)
+	if success:
+		return [success, msg]
+	msgs.append(msg)
+
+	[success, msg] = installWithTarball(r_version, package, working_dir)
+	msgs.append(msg)
+	return [success, ", ".join(msgs)]
+
+def closeAppendFiles():
+	for f in _append_files.values():
+		f.close()
+	_append_files.clear()
+
+atexit.register(closeAppendFiles)
+
+# Append text to filename without opening and closing the file on every call
+# Every line is flushed right away so nothing is lost if the screen session is killed
+def appendLine(filename, text: str):
+	filename = str(filename)
+	if filename not in _append_files:
+		_append_files[filename] = open(filename, "a", encoding="utf-8")
+	_append_files[filename].write(text)
+	_append_files[filename].flush()
+
+# Packages already saved in success.txt or fail.txt, read once per file
+def savedAttempts(filename: Path) -> set:
+	if filename not in _attempts_cache:
+		_attempts_cache[filename] = set(filename.read_text(encoding="utf-8").splitlines()) if filename.exists() else set()
+	return _attempts_cache[filename]
+
+# Failure logs in working_dir/failures, listed once per working directory
+def pastFailures(working_dir: str) -> set:
+	if working_dir not in _failures_cache:
+		try:
+			_failures_cache[working_dir] = set(os.listdir(f"{working_dir}/failures"))
+		except OSError:
+			_failures_cache[working_dir] = set()
+	return _failures_cache[working_dir]
+
+def failureLogName(pkg: str) -> str:
+	return re.sub(r"[^\w]", "_", pkg) + ".txt"
+
+def hadFailed(pkg: str, working_dir: str) -> bool:
+	return failureLogName(pkg) in pastFailures(working_dir)
 
 def saveInstallAttempt(success: bool, pkg:str, message: str, working_dir: str):
 	base_dir = Path(working_dir)
 	base_dir.mkdir(parents=True, exist_ok=True)
 
 	filename = base_dir / ("success.txt" if success else "fail.txt")
-	line = pkg + "\n"
-	if not filename.exists() or line not in filename.read_text(encoding="utf-8").splitlines(keepends=True):
-		with filename.open("a", encoding="utf-8") as f:
-			f.write(line)
+	saved = savedAttempts(filename)
+	if pkg not in saved:
+		appendLine(filename, pkg + "\n")
+		saved.add(pkg)
 
-	if (not success):
+	# A lock collision isn't a real failure, don't skip the package in the next runs
+	if (not success) and (not hadFailed(pkg, working_dir)) and (not isLockFailure(message)):
 		line = "\n"+message.rstrip("\r\n")+"\n"
 		log_dir = base_dir / "failures"
 		log_dir.mkdir(parents=True, exist_ok=True)
 
-		safe_pkg = re.sub(r"[^\w]", "_", pkg)
-		log_file = log_dir / f"{safe_pkg}.txt"
-		if not os.path.isfile(log_file):
-			with (log_file).open("w", encoding="utf-8") as f:
-				f.write(line)
+		log_file = log_dir / failureLogName(pkg)
+		with (log_file).open("w", encoding="utf-8") as f:
+			f.write(line)
+		pastFailures(working_dir).add(log_file.name)
+
+# Packages available through BiocManager, fetched once instead of once per package
+def biocPackages() -> set:
+	global _bioc_packages
+	if _bioc_packages is None:
+		r_code = '''
+			if (!requireNamespace("BiocManager", quietly=TRUE)) quit(status=0)
+			cat(tryCatch(BiocManager::available(), error=function(e) character()), sep="\\n")
+		'''
+		[returncode, stderr, stdout] = installib.runBash(["R", "--slave", "-e", r_code])
+		if returncode!=0:
+			print(stderr)
+			_bioc_packages = set()
+		else:
+			_bioc_packages = set((stdout or "").split())
+
+	return _bioc_packages
 
 def isBiocPackage(pkg_name: str):
-	r_code = f'''
-		if (!requireNamespace("BiocManager", quietly=TRUE)) {{
-			cat("UNKNOWN"); quit(status=0)
-		}}
+	return pkg_name in biocPackages()
 
-		avail <- tryCatch(BiocManager::available(), error=function(e) character())
-		cat(if ("{pkg_name}" %in% avail) "YES" else "NO")
-	'''
-	[returncode, stderr, stdout] = installib.runBash(["R", "--slave", "-e", r_code])
-	if returncode!=0:
-		print(stderr)
-		return False
-	return (stdout or "").strip()=="YES"
+def _initWorker(lock):
+	global _log_lock
+	_log_lock = lock
 
-def migrateVersions(v_new, v_old, working_dir, quiet):
+# R locks each package directory while installing it. All the workers install in the same library,
+# so a package can fail only because another worker was installing it as a dependency at the same time
+def isLockFailure(msg: str) -> bool:
+	return "00LOCK" in msg or "failed to lock directory" in msg
+
+def runTask(pkg: str, task):
+	try:
+		return task()
+	except Exception as e:
+		return [False, f"Installation of {pkg} failed with error: {e}"]
+
+# Run the install tasks in a pool of worker processes
+# tasks is a list of [pkg, callable], yields [pkg, success, msg] in the order the installs finish
+# Installs that failed on a lock held by another worker are retried one at a time once the pool is done
+def runInstalls(tasks: list, jobs: int):
+	# Each install runs its own make, split the cores between the parallel installs
+	os.environ.setdefault("MAKEFLAGS", f"-j{max(1, (os.cpu_count() or 1)//jobs)}")
+
+	retry = []
+	lock = multiprocessing.Lock()
+	with ProcessPoolExecutor(max_workers=jobs, initializer=_initWorker, initargs=(lock,)) as pool:
+		futures = {pool.submit(runTask, pkg, task): [pkg, task] for pkg, task in tasks}
+		for future in as_completed(futures):
+			[pkg, task] = futures[future]
+			try:
+				[success, msg] = future.result()
+			except Exception as e:
+				[success, msg] = [False, f"Installation of {pkg} failed with error: {e}"]
+			if (not success) and isLockFailure(msg):
+				print(f"{pkg} was locked by another install, it will be retried at the end")
+				retry += [[pkg, task]]
+			else:
+				yield [pkg, success, msg]
+
+	for [pkg, task] in retry:
+		yield [pkg] + runTask(pkg, task)
+
+# Check the packages of a migration step with a single R process
+# Records the ones that are already installed and returns the rest
+def pendingInstalls(r_version: str, packages: list[str], working_dir: str) -> list[str]:
+	# Previous steps may have installed some of them as dependencies
+	_installed_cache.clear()
+	_library_cache.clear()
+
+	pending = []
+	for [pkg, installed] in bulkIsInstalled(r_version, packages).items():
+		if installed:
+			print(f"{pkg} is already installed in R/{r_version}")
+			saveInstallAttempt(True, pkg, "", working_dir)
+		else:
+			pending += [pkg]
+
+	return pending
+
+def migrateVersions(v_new, v_old, working_dir, quiet, jobs):
 	# Get the list of packages in the new version
 	savePackageList(v_new, working_dir)
 
@@ -268,54 +462,53 @@ def migrateVersions(v_new, v_old, working_dir, quiet):
 	savePackageList(v_old, working_dir)
 
 	# Get the list of packages missing in the new version
-	comparePackages(v_new, v_old, working_dir)
+	missing = comparePackages(v_new, v_old, working_dir)
 
-	# Install known dependencies of some known missing packages
+	# Read the packages to install
 	with open("r_deps.txt", "r") as f:
-		for dep in f:
-			dep = dep.rstrip("\n")
-			[success, msg] = installPackage(v_new, working_dir, pkg_install=dep)
-			saveInstallAttempt(success, dep, msg, working_dir)
-			if success:
-				print(f"Install of {dep} was successful\n")
-			else:
-				print(f"Install of {dep} failed\n")
+		deps = [dep.rstrip("\n") for dep in f]
 
-	# Install Git packages
+	git_pkgs = {}
 	with open("r_gitdeps.txt", "r") as f:
 		for line in f:
 			pkg, repo = line.rstrip("\n").split(":")
-			[success, msg] = installPackage(v_new, working_dir, pkg_install=pkg, gitRepo=repo)
-			saveInstallAttempt(success, pkg, msg, working_dir)
-
-			if success:
-				print(f"Install of {pkg} was successful\n")
-				if pkg=="loupeR" and (not quiet):
-					runRcmd(f"loupeR::setup()")
-				else:
-					print("YOU MUST RUN loupeR::setup() TO COMPLETE INSTALL!!")
+			git_pkgs[pkg] = repo
 
-			else:
-				print(f"Install of {pkg} failed\n")
+	# Skip library entries that are not packages
+	missing = [pkg for pkg in missing if pkg and not (pkg[0].isdigit() or pkg.startswith("_"))]
 
-	# Install other packages
-	with open(f"{working_dir}/missing.txt", "r") as fin:
-		for line in fin:
-			line = line.replace("\n","").replace("> ","")
-			if line.startswith("<") or line[0].isdigit() or line.startswith("_"):
-				continue
+	# Install known dependencies of some known missing packages
+	tasks = [[dep, partial(installPackage, v_new, working_dir, pkg_install=dep)] for dep in pendingInstalls(v_new, deps, working_dir)]
+	for [dep, success, msg] in runInstalls(tasks, jobs):
+		saveInstallAttempt(success, dep, msg, working_dir)
+		if success:
+			print(f"Install of {dep} was successful\n")
+		else:
+			print(f"Install of {dep} failed\n")
 
-			if isBiocPackage(line):
-				[success, msg] = installPackage(v_new, working_dir, pkg_install=line, bioc=True)
+	# Install Git packages
+	tasks = [[pkg, partial(installPackage, v_new, working_dir, pkg_install=pkg, gitRepo=git_pkgs[pkg])] for pkg in pendingInstalls(v_new, list(git_pkgs), working_dir)]
+	for [pkg, success, msg] in runInstalls(tasks, jobs):
+		saveInstallAttempt(success, pkg, msg, working_dir)
 
+		if success:
+			print(f"Install of {pkg} was successful\n")
+			if pkg=="loupeR" and (not quiet):
+				runRcmd(f"loupeR::setup()")
 			else:
-				[success, msg] = installPackage(v_new, working_dir, pkg_install=line)
+				print("YOU MUST RUN loupeR::setup() TO COMPLETE INSTALL!!")
 
-			saveInstallAttempt(success, line, msg, working_dir)
-			if success:
-				print(f"Install of {line} was successful\n")
-			else:
-				print(f"Install of {line} failed\n")
+		else:
+			print(f"Install of {pkg} failed\n")
+
+	# Install other packages
+	tasks = [[pkg, partial(installPackage, v_new, working_dir, pkg_install=pkg, bioc=isBiocPackage(pkg))] for pkg in pendingInstalls(v_new, missing, working_dir)]
+	for [pkg, success, msg] in runInstalls(tasks, jobs):
+		saveInstallAttempt(success, pkg, msg, working_dir)
+		if success:
+			print(f"Install of {pkg} was successful\n")
+		else:
+			print(f"Install of {pkg} failed\n")
 
 # Get list of mandatory dependencies
 # repo_mode can be "cran" or "bioc"
@@ -368,7 +561,7 @@ def getRversion():
 		return None
 
 def main():
-	[v_new, v_old, migrate, pkg_install, git_repo, working_dir, pkg_update, quiet] = parse_arguments()
+	[v_new, v_old, migrate, pkg_install, git_repo, working_dir, pkg_update, quiet, jobs] = parse_arguments()
 
 	# Check R version
 	rVers = getRversion()
@@ -392,7 +585,7 @@ def main():
 		print("")
 
 	if migrate:
-		migrateVersions(v_new, v_old, working_dir, quiet)
+		migrateVersions(v_new, v_old, working_dir, quiet, jobs)
 
 	if pkg_install and (not git_repo):
 		[success, msg] = installPackage(v_new, working_dir, pkg_install=pkg_install, check_pastFail=False)	
@@ -438,16 +631,12 @@ def main():
 
 		file1 = f"{working_dir}/fail_Feb26.csv"
 		file2 = f"{working_dir}/installed_Feb26.csv"
+		# Updates run one at a time: a package being replaced can't be loaded by another install's checks
 		for pkg in bioc_packages+other_packages:
 			[success, msg] = installPackage(v_new, working_dir, pkg_update=pkg, check_pastFail=False, bioc=(pkg in bioc_packages))
 			if msg!="":
 				print(f"{pkg},{msg}\n")
-			if not success:
-				with open(file1, "a") as f1:
-					f1.write(f"{pkg},{msg}")
-			else:
-				with open(file2,'a') as f2:
-					f2.write(f"{pkg},{msg}")
+			appendLine(file2 if success else file1, f"{pkg},{msg}")
 
 	print("*** SCRIPT DONE ***")
 
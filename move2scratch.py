@@ -6,10 +6,12 @@ __purpose__ = "Copy files to scratch before submission"
 import argparse
 import sys
 import os
-from typing import List
+from typing import List, Tuple
 import getpass
 import grp
 import shutil
+import stat
+from concurrent.futures import ThreadPoolExecutor
 
 def parse_args():
     """Parse command-line arguments and return them."""
@@ -25,8 +27,8 @@ def parse_args():
     
     return parser.parse_args()
 
-def readInputFiles(input_list: str) -> List[str]:
-    """Read list of input files."""
+def readInputFiles(input_list: str) -> List[Tuple[str, os.stat_result]]:
+    """Read list of input files. Returns each path with its stat, so it doesn't need to be checked again."""
     # Perform checks
     if not input_list.endswith(".txt"):
         raise Exception(f"Invalid file type: '{input_list}'. Only .txt files are allowed.")
@@ -42,10 +44,12 @@ def readInputFiles(input_list: str) -> List[str]:
             if not path:
                 continue
 
-            if not os.path.exists(path):
+            try:
+                st = os.stat(path)
+            except (OSError, ValueError):
                 raise FileNotFoundError(f"Path '{path}' does not exist.")
             
-            paths.append(path)
+            paths.append((path, st))
 
     return paths
 
@@ -69,48 +73,147 @@ def checkScript(script: str) -> bool:
 
     return True
 
-def computeSize(path):
+def computeSize(path, limit=None):
     """
     Returns size of path in GB
+    If a limit in GB is given, stops counting once the size reaches it
     """
     if os.path.isfile(path):
         return os.path.getsize(path) / 1_000_000_000
     
+    limit_bytes = None if limit is None else limit * 1_000_000_000
     total = 0
-    for root, _, files in os.walk(path):
-        for f in files:
-            fp = os.path.join(root, f)
-            if os.path.isfile(fp):
-                total += os.path.getsize(fp)
+    stack = [path]
+    while stack:
+        # Same as os.walk, skip directories that can't be read
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    size = entry.stat().st_size
+
+                # Only skip this entry (e.g. a file removed while scanning), not the rest of the directory
+                except OSError:
+                    continue
+
+                total += size
+                if limit_bytes is not None and total >= limit_bytes:
+                    return total / 1_000_000_000
+
     return total / 1_000_000_000
 
-def copyFiles(input_files: List[str], output_dir: str, force: bool):
-    for src in input_files:
+def copyFileRange(src: str, dest: str) -> str:
+    """
+    Copies src to dest with os.copy_file_range, so the data is copied by the kernel
+    (or the file server) instead of going through user space. Keeps metadata like shutil.copy2.
+    Falls back to shutil.copy2 where copy_file_range is not available or not supported.
+    """
+    if not hasattr(os, "copy_file_range"):
+        return shutil.copy2(src, dest)
+
+    # Same checks as shutil.copyfile before opening (and truncating) dest
+    dest_st = statOrNone(dest)
+    if dest_st is not None and os.path.samefile(src, dest):
+        raise shutil.SameFileError(f"{src!r} and {dest!r} are the same file")
+
+    # shutil.copy2 raises the right error for pipes, sockets and devices instead of blocking on them
+    if not stat.S_ISREG(os.stat(src).st_mode) or (dest_st is not None and not stat.S_ISREG(dest_st.st_mode)):
+        return shutil.copy2(src, dest)
+
+    try:
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdest.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+
+    except OSError:
+        return shutil.copy2(src, dest)
+
+    shutil.copystat(src, dest)
+    return dest
+
+def copySource(src: str, dest: str, is_dir: bool):
+    if is_dir:
+        shutil.copytree(src, dest, dirs_exist_ok=True, copy_function=copyFileRange)
+
+    else:
+        copyFileRange(src, dest)
+
+def statOrNone(path: str):
+    """Returns os.stat(path), or None if path doesn't exist (same as os.path.exists)."""
+    try:
+        return os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+def copyToDest(sources: List[Tuple[str, bool]], dest: str):
+    """Copies the sources that share the same dest one after another, in the order they were listed."""
+    for src, is_dir in sources:
+        try:
+            copySource(src, dest, is_dir)
+        except Exception as e:
+            raise Exception(f"Could not copy {src} to {dest}: {e}") from e
+
+def copyFiles(input_files: List[Tuple[str, os.stat_result]], output_dir: str, force: bool):
+    # Ask all the questions first, then copy the accepted sources in parallel
+    # Sources with the same basename are grouped by dest, so they are never copied at the same time
+    to_copy = {}
+    for src, src_st in input_files:
         basename = os.path.basename(src)
         dest = os.path.join(output_dir, basename)
 
-        if os.path.isfile(src) and os.path.exists(dest):
-            if os.path.isfile(dest) and not force and input(f"{dest} already exists. Overwrite? [y/N] ")!='y':
+        # One stat per path instead of an exists/isfile/isdir call for each check
+        src_is_dir = stat.S_ISDIR(src_st.st_mode)
+        if stat.S_ISREG(src_st.st_mode):
+            # A source listed earlier with the same basename will have created dest by the time this one is copied
+            dest_st = statOrNone(dest)
+            planned = to_copy.get(dest, [])
+            dest_is_dir = (dest_st is not None and stat.S_ISDIR(dest_st.st_mode)) or any(is_dir for _, is_dir in planned)
+            dest_is_file = (not dest_is_dir) and (bool(planned) or (dest_st is not None and stat.S_ISREG(dest_st.st_mode)))
+
+            if dest_is_file and not force and input(f"{dest} already exists. Overwrite? [y/N] ")!='y':
                 print(f"Skipping {src}")
                 continue
 
-            elif os.path.isdir(dest):
+            elif dest_is_dir:
                 print(f"Cannot override directory {dest} with file {src}.")
                 continue
 
-        size = computeSize(src)
+        size = computeSize(src, limit=100) if src_is_dir else src_st.st_size / 1_000_000_000
         if size>=25 and size<100 and input(f"You are about to copy {size}GB to scratch. Continue? [y/N] ")!='y':
             print(f"Skipping {src}")
             continue
         if size>=100:
-            print(f"The size of {src} is {size}GB. That's too large, skipping {src}.")
+            print(f"The size of {src} is at least 100GB. That's too large, skipping {src}.")
             continue
             
-        if os.path.isdir(src):
-            shutil.copytree(src, dest, dirs_exist_ok=True)
+        to_copy.setdefault(dest, []).append((src, src_is_dir))
 
-        else:
-            shutil.copy2(src, dest)
+    if not to_copy:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(8, len(to_copy))) as pool:
+        futures = [pool.submit(copyToDest, sources, dest) for dest, sources in to_copy.items()]
+
+    # Report every failed copy, not only the first one
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    for e in errors:
+        print(f"ERROR: {e}", file=sys.stderr)
+
+    if errors:
+        raise Exception(f"{len(errors)} of {len(futures)} copies failed, the destinations listed above may be incomplete.")
 
 def validateOutputDir(output_dir: str, slurm_script: str) -> str:
     """
@@ -2,23 +2,24 @@
 __author__ = "Monica Keith"
 __status__ = "Development"
 
-import pandas as pd
+import xlsxwriter
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import stat
 import re
+import os
+from operator import itemgetter
 
-DEP_RE = re.compile(r'\bdepends_on\s*\(\s*"([^"]+)"\s*\)')
-
-def getDependencies(module_file: Path) -> list[str]:
-    deps = set()
+# Matched on the raw bytes so the files don't need to be decoded
+DEP_RE = re.compile(rb'\bdepends_on\s*\(\s*"([^"]+)"\s*\)')
+COLUMNS = ["module_name", "version", "public", "last_mod", "dependencies"]
 
+def getDependencies(module_file: str) -> list[str]:
     try:
-        content = module_file.read_text()
-        for dep in DEP_RE.findall(content):
-            deps.add(dep)
-
-        return sorted(deps)
+        with open(module_file, "rb") as f:
+            content = f.read()
+        return sorted({dep.decode() for dep in DEP_RE.findall(content)})
 
     except (FileNotFoundError, PermissionError, IsADirectoryError) as e:
         raise RuntimeError(f"Unreadable file: {e}") from e
@@ -29,56 +30,76 @@ def getDependencies(module_file: Path) -> list[str]:
     except OSError as e:
         raise RuntimeError(f"Error reading: {e}") from e
 
-def scanModules() -> pd.DataFrame:
-    rows = []
-    root_path = Path("/hpc/modulefiles")
-
-    for lua in root_path.rglob("*/*.lua"):
+# Yields (module_name, DirEntry) for the same files as Path(root).rglob("*/*.lua")
+# module_name is the name of the directory that contains the file
+def findModuleFiles(root: str):
+    # Symlinked directories are read but not descended into, like rglob does
+    stack = [(root, "", True)]
+    while stack:
+        path, module, recurse = stack.pop()
         try:
-            module = lua.parent.name
-            last = lua.name
-            version = Path(last).stem.lstrip('.')
-            hidden = last.startswith(".")
-            st = lua.stat()
-            readable_by_others = bool(st.st_mode & stat.S_IROTH)
-            public = (not hidden) and readable_by_others
-            mod = datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d")
-            dependencies = getDependencies(lua)
-
-            rows.append({
-                "module_name": module,
-                "version": version,
-                "public": public,
-                "last_mod": mod,
-                "dependencies": "; ".join(dependencies)
-            })
-
-        except RuntimeError as e:
-            print(f"Could not read {lua}: {e}")
-            continue
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if recurse:
+                            stack.append((entry.path, entry.name, not entry.is_symlink()))
+
+                    elif module and entry.name.endswith(".lua"):
+                        yield module, entry
 
         except OSError as e:
-            print(f"Skipping {lua} due to filesystem error: {e}")
-            continue
+            print(f"Skipping {path} due to filesystem error: {e}")
+
+def scanModuleFile(module: str, lua: os.DirEntry) -> tuple:
+    last = lua.name
+    version = Path(last).stem.lstrip('.')
+    hidden = last.startswith(".")
+    st = lua.stat()
+    readable_by_others = bool(st.st_mode & stat.S_IROTH)
+    public = (not hidden) and readable_by_others
+    mod = datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d")
+    dependencies = getDependencies(lua.path)
+
+    return (module, version, public, mod, "; ".join(dependencies))
+
+# Returns one tuple per module file, with the values of COLUMNS, sorted by module name and version
+def scanModules() -> list[tuple]:
+    rows = []
 
-    df = pd.DataFrame(rows)
-    if not df.empty:
-        df = df.sort_values(["module_name", "version"], kind="stable").reset_index(drop=True)
-    
-    return df
+    # Reading the files is I/O bound, so threads can overlap the reads
+    # Results are collected in walk order so modules with the same name and version keep a stable order
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        futures = {lua.path: pool.submit(scanModuleFile, module, lua) for module, lua in findModuleFiles("/hpc/modulefiles")}
+        for lua, future in futures.items():
+            try:
+                rows.append(future.result())
+
+            except RuntimeError as e:
+                print(f"Could not read {lua}: {e}")
+                continue
+
+            except OSError as e:
+                print(f"Skipping {lua} due to filesystem error: {e}")
+                continue
+
+    rows.sort(key=itemgetter(0, 1))
+    return rows
 
 def main():
-    df = scanModules()
+    rows = scanModules()
     output = f"module_scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
 
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name="modules", index=False)
+    # In constant_memory mode each row is written to disk once the next one starts
+    with xlsxwriter.Workbook(output, {"constant_memory": True}) as wb:
+        ws = wb.add_worksheet("modules")
+        ws.freeze_panes(1, 0)
+        ws.autofilter(0, 0, len(rows), len(COLUMNS)-1)
 
-        ws = writer.sheets["modules"]
-        ws.freeze_panes = "A2" 
-        ws.auto_filter.ref = ws.dimensions
+        ws.write_row(0, 0, COLUMNS)
+        for i, row in enumerate(rows, start=1):
+            ws.write_row(i, 0, row)
 
-    print(f"Wrote {len(df)} rows to {output}")
+    print(f"Wrote {len(rows)} rows to {output}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file